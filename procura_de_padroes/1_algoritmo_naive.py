@@ -16,10 +16,42 @@ def procura_naive(seq, pattern):
             res.append(i)                                    # junta-se à lista de resultados a posição em que o padrão foi inicialmente encontrado na sequência
     return res
 
+def procura_naive_multi(seq, patterns):
+    # versão para muitos padrões: a sequência é convertida uma única vez (str -> bytes)
+    # e cada padrão é procurado com o método find, que compara os caracteres em C
+    # em vez de um ciclo em Python por posição. Devolve {padrao: posições}, com as
+    # mesmas posições (incluindo sobreposições) que procura_naive.
+    if isinstance(seq, str):
+        texto = seq.encode('latin-1')                        # codificação feita uma só vez para todos os padrões
+    else:
+        texto = bytes(seq)                                   # aceita também bytes, bytearray ou memoryview
+    res = {}
+    for pattern in patterns:
+        if pattern in res: continue                          # padrões repetidos só são procurados uma vez
+        if isinstance(pattern, str):
+            p = pattern.encode('latin-1')
+        else:
+            p = bytes(pattern)
+        pos = []
+        i = texto.find(p)
+        while i != -1:
+            pos.append(i)
+            i = texto.find(p, i+1)                           # avançar só uma posição para apanhar ocorrências sobrepostas
+        res[pattern] = pos
+    return res
+
 def teste():
     seq     = input('Sequence: ')
     pattern = input('Pattern: ') 
     pos     = procura_naive(seq, pattern)
     print('Pattern occurs in positions:', pos)
 
+def teste_multi():
+    seq      = 'ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC'
+    patterns = ['ACCA', 'ATG', 'CC', 'GGG']
+    res      = procura_naive_multi(seq, patterns)
+    for p in patterns:
+        print(p, res[p], res[p] == procura_naive(seq, p))
+
 teste()
+#teste_multi()
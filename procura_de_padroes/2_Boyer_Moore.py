@@ -9,6 +9,16 @@
 # 
 #################################################################################################
 
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")                    # soft-masked (lowercase) bases keep their case
+
+
 class BoyerMoore:
     
     def __init__(self, alphabet, pattern):
@@ -77,15 +87,438 @@ class BoyerMoore:
                 i = i + self.s[0]                                             
             else:                                                            
                 c = text[j+i]                                                 
-                i += max(self.s[j+1], j-self.occ[c])                          
+                i += max(self.s[j+1], j-self.occ.get(c, -1))                  # symbols outside the alphabet are absent from the pattern
+        return res
+
+    def search_chunks(self, chunks):
+        '''
+        Searches the pattern in a text given as a sequence of consecutive chunks.
+        The last len(pattern)-1 characters of each chunk are kept and prepended to the next one,
+        so matches that cross a chunk boundary are found and none is reported twice.
+
+        Parameters
+        ----------
+        chunks : iterable of str
+
+        Yields
+        -------
+        int
+            The global index (in the concatenated text) of each occurrence, in increasing order.
+        '''
+        keep = len(self.pattern) - 1                                          # overlap needed between consecutive chunks
+        offset = 0                                                            # global index of the first character of buf
+        tail = None
+        for chunk in chunks:
+            buf = tail + chunk if tail else chunk
+            for i in self.search_pattern(buf):
+                yield offset + i
+            k = min(keep, len(buf))
+            offset += len(buf) - k
+            tail = buf[len(buf)-k:]
+
+    def search_file(self, filename, chunk_size = 1048576, use_mmap = False):
+        '''
+        Searches the pattern in a file without loading the whole file into memory.
+        The file must contain only the raw sequence: every byte (including newlines) is part of the text,
+        so for FASTA files use search_fasta instead.
+        The file is read in chunks of chunk_size bytes (or sliced from a read-only mmap of the file,
+        if use_mmap is True) and each chunk is decoded as latin-1, so positions are byte offsets.
+
+        Parameters
+        ----------
+        filename   : str
+        chunk_size : int
+        use_mmap   : bool
+
+        Yields
+        -------
+        int
+            The byte offset of each occurrence of the pattern in the file.
+        '''
+        with open(filename, "rb") as fh:
+            if use_mmap:
+                if os.fstat(fh.fileno()).st_size == 0: return               # empty files cannot be mapped
+                with mmap.mmap(fh.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+                    chunks = (mm[i:i+chunk_size].decode("latin-1") for i in range(0, len(mm), chunk_size))
+                    yield from self.search_chunks(chunks)
+            else:
+                chunks = iter(lambda: fh.read(chunk_size).decode("latin-1"), "")
+                yield from self.search_chunks(chunks)
+
+    def search_fasta(self, filename, chunk_size = 1048576):
+        '''
+        Searches the pattern in each record of a FASTA file without loading the file into memory.
+        Header lines (starting with ">") are skipped and line breaks are removed, so occurrences that cross
+        a line break are found and offsets are positions in the sequence of the record.
+        Lines are read in pieces of at most chunk_size characters, so long unwrapped sequences are also bounded.
+
+        Parameters
+        ----------
+        filename   : str
+        chunk_size : int
+
+        Yields
+        -------
+        (header, int)
+            The header of the record (without ">") and the position of the occurrence in its sequence.
+        '''
+        keep = len(self.pattern) - 1
+        header = None
+        offset = 0                                                            # position in the record of the first character of tail
+        tail = ""
+        at_line_start = True
+        with open(filename, "r", encoding = "latin-1") as fh:
+            while True:
+                line = fh.readline(chunk_size)
+                if not line: break
+                line_start = at_line_start
+                at_line_start = line.endswith("\n")
+                if line_start and line.startswith(">"):                      # new record: restart the search
+                    header = line[1:]
+                    while not at_line_start:                                  # rest of a very long header
+                        line = fh.readline(chunk_size)
+                        if not line: break
+                        header += line
+                        at_line_start = line.endswith("\n")
+                    header = header.strip()
+                    offset = 0
+                    tail = ""
+                    continue
+                buf = tail + line.strip()
+                for i in self.search_pattern(buf):
+                    yield (header, offset + i)
+                k = min(keep, len(buf))
+                offset += len(buf) - k
+                tail = buf[len(buf)-k:]
+
+    def search_parallel(self, text, workers = None, chunk_size = None):
+        '''
+        Searches the pattern in a long text using a pool of processes.
+        The text is split into chunks that overlap by len(pattern)-1 characters; the preprocessed
+        object is sent once to each worker (pool initializer), so only the chunks travel with the tasks.
+        Chunks are cut only when they are submitted and at most 2*workers tasks are pending at a time,
+        so the copies in flight take about 2*workers*chunk_size characters, not another copy of the text.
+
+        Parameters
+        ----------
+        text       : str (or bytes, for ByteBoyerMoore)
+        workers    : int, number of processes (default: os.cpu_count())
+        chunk_size : int, number of alignment positions per chunk
+                     (default: text split evenly by workers, at most 1048576)
+
+        Returns
+        -------
+        res : list
+            Sorted list, without repetitions, of the indexes where the pattern was found in the text.
+        '''
+        if workers is None: workers = os.cpu_count() or 1
+        if chunk_size is None: chunk_size = max(min(-(-len(text) // workers), 1048576), 1)
+        keep = len(self.pattern) - 1
+        tasks = ((text[start:start+chunk_size+keep], start) for start in range(0, len(text), chunk_size))
+        res = set()
+        pending = set()
+        with ProcessPoolExecutor(workers, initializer = init_worker, initargs = (self,)) as pool:
+            for task in tasks:
+                if len(pending) >= 2*workers:                                  # wait for a slot before cutting the next chunk
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                    for f in done: res.update(f.result())
+                pending.add(pool.submit(search_worker, task))
+            for f in pending: res.update(f.result())
+        return sorted(res)
+
+    def search_sequences(self, seqs, workers = None):
+        '''
+        Searches the pattern in each sequence of a list using a pool of processes.
+
+        Parameters
+        ----------
+        seqs    : list of str (or bytes, for ByteBoyerMoore)
+        workers : int, number of processes (default: os.cpu_count())
+
+        Returns
+        -------
+        res : list
+            For each sequence, the list of indexes where the pattern was found.
+        '''
+        if workers is None: workers = os.cpu_count() or 1
+        with ProcessPoolExecutor(workers, initializer = init_worker, initargs = (self,)) as pool:
+            return list(pool.map(search_worker, [(seq, 0) for seq in seqs]))
+
+
+class ByteBoyerMoore(BoyerMoore):
+    '''
+    Boyer-Moore over bytes: the text may be bytes, bytearray, memoryview or mmap (a str is encoded as latin-1).
+    The bad character table is a flat array of 256 ints indexed by byte value and the good sufix table
+    is an array('i'), so the search loop does no dictionary lookups and creates no strings.
+    With horspool = True only the Horspool shift (last character of the window) is used,
+    which is usually faster for large alphabets such as proteins.
+    '''
+
+    def __init__(self, pattern, horspool = False):
+        if isinstance(pattern, str):
+            pattern = pattern.encode("latin-1")
+        self.horspool = horspool
+        BoyerMoore.__init__(self, range(256), bytes(pattern))
+
+    def preprocess(self):
+        if self.horspool:
+            self.process_horspool()
+        else:
+            BoyerMoore.preprocess(self)
+
+    def process_bcr(self):
+        '''
+        Bad character rule processing: occ[c] is the last position of the byte c in the pattern, or -1.
+        '''
+        self.occ = array("i", [-1]) * 256
+        for i in range(len(self.pattern)):
+            self.occ[self.pattern[i]] = i
+
+    def process_gsr(self):
+        '''
+        Good sufix rule, computed as in BoyerMoore and stored in array('i') tables.
+        '''
+        BoyerMoore.process_gsr(self)
+        self.f = array("i", self.f)
+        self.s = array("i", self.s)
+
+    def process_horspool(self):
+        '''
+        Horspool shift table: distance from the last occurrence of each byte (excluding the last position
+        of the pattern) to the end of the pattern; bytes absent from the pattern shift by len(pattern).
+        '''
+        m = len(self.pattern)
+        self.shift = array("i", [m]) * 256
+        for i in range(m-1):
+            self.shift[self.pattern[i]] = m-1-i
+
+    def search_pattern(self, text):
+        '''
+        Parameters
+        ----------
+        text : bytes, bytearray, memoryview, mmap or str
+
+        Returns
+        -------
+        res : list
+            A list that contains the indexes where the pattern was found in the text.
+        '''
+        if isinstance(text, str):
+            text = text.encode("latin-1")
+        p = self.pattern
+        m = len(p)
+        res = []
+        i = 0
+        last = len(text) - m
+        if self.horspool:
+            shift = self.shift
+            while i <= last:
+                j = m-1
+                while j >= 0 and p[j] == text[j+i]:
+                    j -= 1
+                if j < 0:
+                    res.append(i)
+                i += shift[text[i+m-1]]                                       # shift by the character aligned with the end of the pattern
+        else:
+            occ = self.occ
+            s = self.s
+            while i <= last:
+                j = m-1
+                while j >= 0 and p[j] == text[j+i]:
+                    j -= 1
+                if j < 0:
+                    res.append(i)
+                    i += s[0]
+                else:
+                    i += max(s[j+1], j-occ[text[j+i]])
         return res
+
+
+def reverse_complement(seq):
+    '''Reverse complement of a DNA sequence (A<->T, C<->G, N unchanged; lowercase stays lowercase).'''
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+class BothStrandsBoyerMoore:
+    '''
+    Searches a DNA pattern on both strands with a single pass over the forward text.
+    The pattern and its reverse complement are preprocessed together; at each alignment both are
+    compared and the window moves by the smaller of the two Boyer-Moore shifts, which is safe for both.
+    '''
+
+    def __init__(self, alphabet, pattern):
+        self.alphabet = alphabet
+        self.pattern = pattern
+        self.forward = BoyerMoore(alphabet, pattern)
+        self.reverse = BoyerMoore(alphabet, reverse_complement(pattern))
+
+    def search_pattern(self, text):
+        '''
+        Parameters
+        ----------
+        text : str
+
+        Returns
+        -------
+        res : list
+            List of tuples (index, strand), sorted by index: strand is "+" if the pattern occurs at index
+            and "-" if its reverse complement does (palindromic patterns are reported on both strands).
+        '''
+        m = len(self.pattern)
+        res = []
+        i = 0
+        while i <= (len(text)-m):
+            shift = m
+            for bm, strand in ((self.forward, "+"), (self.reverse, "-")):
+                j = m-1
+                while j >= 0 and bm.pattern[j] == text[j+i]:
+                    j -= 1
+                if j < 0:
+                    res.append((i, strand))
+                    shift = min(shift, bm.s[0])
+                else:
+                    shift = min(shift, max(bm.s[j+1], j-bm.occ.get(text[j+i], -1)))
+            i += shift
+        return res
+
+
+worker_bm = None                                                              # preprocessed pattern of the current worker process
+
+
+def init_worker(bm):
+    '''Pool initializer: keeps the preprocessed BoyerMoore object in the worker process.'''
+    global worker_bm
+    worker_bm = bm
+
+
+def search_worker(task):
+    '''Searches one (text, offset) task with the worker's pattern and returns global indexes.'''
+    text, offset = task
+    return [offset + i for i in worker_bm.search_pattern(text)]
+
+
+class PatternCache:
+    '''
+    LRU cache of preprocessed BoyerMoore objects, keyed by (alphabet, pattern).
+    Repeated searches for the same pattern reuse the bad character and good sufix tables
+    instead of running process_bcr and process_gsr again.
+    All methods hold self.lock, so one cache can be shared by the threads of a service;
+    a missing pattern is preprocessed outside the lock.
+    '''
+
+    def __init__(self, maxsize = 1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()                                          # (alphabet, pattern) -> BoyerMoore, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()                                         # reentrant: set_maxsize and get call evict
+
+    def get(self, alphabet, pattern):
+        '''
+        Returns the BoyerMoore object for the pattern, building it only if it is not cached.
+
+        Parameters
+        ----------
+        alphabet : str
+        pattern  : str
+
+        Returns
+        -------
+        BoyerMoore
+        '''
+        key = (alphabet, pattern)
+        with self.lock:
+            bm = self.entries.get(key)
+            if bm is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)                                 # mark as most recently used
+                return bm
+            self.misses += 1
+        bm = BoyerMoore(alphabet, pattern)                                    # without the lock: other patterns are not blocked
+        with self.lock:
+            if self.maxsize > 0:
+                bm = self.entries.setdefault(key, bm)                         # another thread may have added it meanwhile
+                self.entries.move_to_end(key)
+                self.evict()
+        return bm
+
+    def evict(self):
+        '''Removes the least recently used entries until the cache fits in maxsize.'''
+        with self.lock:
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last = False)
+
+    def set_maxsize(self, maxsize):
+        with self.lock:
+            self.maxsize = maxsize
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        '''
+        Returns
+        -------
+        dict
+            Number of hits and misses, hit rate, current size and maximum size of the cache.
+        '''
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "size": len(self.entries), "maxsize": self.maxsize}
+
+
+pattern_cache = PatternCache()                                                # module-level cache shared by compiled_pattern
+
+
+def compiled_pattern(alphabet, pattern):
+    '''Returns a preprocessed BoyerMoore object for the pattern, using the module-level LRU cache.'''
+    return pattern_cache.get(alphabet, pattern)
                 
              
 def test():
     bm = BoyerMoore("ACTG", "ACCA")
     print(bm.search_pattern("ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"))
 
-test()
+def test2():
+    bm = BoyerMoore("ACTG", "ACCA")
+    text = "ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"
+    chunks = [text[i:i+7] for i in range(0, len(text), 7)]
+    print(list(bm.search_chunks(chunks)))
+
+def test3():
+    text = "ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"
+    for p in ["ACCA", "ATG", "ACCA", "ACCA"]:
+        print(p, compiled_pattern("ACTG", p).search_pattern(text))
+    print(pattern_cache.info())
+
+def test4():
+    text = b"ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"
+    print(ByteBoyerMoore(b"ACCA").search_pattern(text))
+    print(ByteBoyerMoore(b"ACCA", horspool = True).search_pattern(memoryview(text)))
+
+def test5():
+    bm = BoyerMoore("ACTG", "ACCA")
+    text = "ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"
+    print(bm.search_parallel(text, workers = 4, chunk_size = 10))
+    print(bm.search_sequences([text, text[5:], "ACCACCA"], workers = 2))
+
+def test6():
+    bm = BothStrandsBoyerMoore("ACTG", "ACCA")
+    print(bm.search_pattern("ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"))
+
+if __name__ == "__main__":
+    test()
+    #test2()
+    #test3()
+    #test4()
+    #test5()
+    #test6()
 
 # result: [5, 13, 23, 37]
             
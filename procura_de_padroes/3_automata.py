@@ -1,3 +1,4 @@
+from array import array
 
 class Automata:
     
@@ -7,14 +8,44 @@ class Automata:
         self.alphabet = alphabet                                               # Alphabet     
         self.transitionTable = {}                                              # Transition table
         self.buildTransitionTable(pattern)        
+        self.buildDenseTable()
     
     def buildTransitionTable(self, pattern):
+        ''' 
+        Builds the table in O(m*|alphabet|) using the failure function of the pattern (as in KMP):
+        from state q, a symbol that continues the pattern goes to q+1; any other symbol behaves as
+        in the state of the longest proper border of pattern[:q], whose row is already built.
+        The result is the same as self.transitionTable[(q,a)] = overlap(pattern[:q]+a, pattern).
+        '''
+        fail = prefix_function(pattern)
         for q in range(self.numstates):
             for a in self.alphabet:
-                prefixo = pattern[:q]+a                                        
-                self.transitionTable[(q,a)] = overlap(prefixo,pattern)         
+                if q < len(pattern) and pattern[q] == a:
+                    self.transitionTable[(q,a)] = q+1
+                elif q == 0:
+                    self.transitionTable[(q,a)] = 0
+                else:
+                    self.transitionTable[(q,a)] = self.transitionTable[(fail[q-1],a)]   # border state < q
                 
        
+    def buildDenseTable(self):
+        ''' 
+        Copies the transition table into a flat array('i') with one row per state:
+        the next state from q with the symbol of code c is self.dense[q*self.width + c].
+        Each symbol is also a key by its byte value (ord), so bytes and memoryview texts give the same codes.
+        '''
+        self.codes = {}                                                        # symbol -> code (column of the table)
+        width = 0
+        for a in self.alphabet:
+            if a not in self.codes:
+                self.codes[a] = width
+                if ord(a) < 256: self.codes[ord(a)] = width                    # bytes and memoryview give ints
+                width += 1
+        self.width = width
+        self.dense = array('i', [0]) * (self.numstates * width)
+        for (q,a), nq in self.transitionTable.items():
+            self.dense[q*width + self.codes[a]] = nq
+       
     def printAutomata(self):
         print ("States: " , self.numstates)
         print ("Alphabet: " , self.alphabet)
@@ -44,6 +75,32 @@ class Automata:
             res.append(q) 
         return res
         
+    def iterMatches(self, text):
+        ''' 
+        Walks the text once over the dense table, keeping only the current state.
+        Symbols that are not in the alphabet send the automaton back to state 0.
+
+        Parameters
+        ----------
+        text : str, bytes or memoryview
+            
+        Yields
+        -------
+        int
+            The start index of each occurrence of the pattern in the text.
+        '''
+        dense = self.dense
+        codes = self.codes
+        width = self.width
+        m = self.numstates - 1                                                 # final state = length of the pattern
+        if m == 0: yield 0
+        q = 0
+        for i in range(len(text)):
+            c = codes.get(text[i])
+            q = 0 if c is None else dense[q*width + c]
+            if q == m:
+                yield i - m + 1
+        
     def occurencesPattern(self, text):
         ''' 
         Parameters
@@ -67,6 +124,65 @@ class Automata:
                 c+=1
         return res
 
+class AutomataMatcher:
+    ''' 
+    Resumable matcher for a text that arrives in pieces: feed() continues from the state
+    and global offset left by the previous call, so occurrences that cross pieces are found.
+    '''
+    
+    def __init__(self, automata):
+        self.automata = automata
+        self.reset()
+        
+    def reset(self):
+        '''Goes back to state 0 and global offset 0 (start of a new text).'''
+        self.state = 0
+        self.offset = 0                                                        # number of symbols fed so far
+        
+    def feed(self, chunk):
+        ''' 
+        Parameters
+        ----------
+        chunk : str, bytes or memoryview
+            The next piece of the text.
+            
+        Returns
+        -------
+        res : list
+            Global start indexes of the occurrences that end inside this chunk.
+        '''
+        dense = self.automata.dense
+        codes = self.automata.codes
+        width = self.automata.width
+        m = self.automata.numstates - 1
+        q = self.state
+        res = []
+        for i in range(len(chunk)):
+            c = codes.get(chunk[i])
+            q = 0 if c is None else dense[q*width + c]
+            if q == m:
+                res.append(self.offset + i - m + 1)
+        self.state = q
+        self.offset += len(chunk)
+        return res
+
+def prefix_function(pattern):
+    ''' 
+    Returns
+    -------
+    pi : list
+        pi[i] is the length of the longest proper prefix of pattern[:i+1] that is also its suffix.
+    '''
+    pi = [0] * len(pattern)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k > 0 and pattern[i] != pattern[k]:
+            k = pi[k-1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        pi[i] = k
+    return pi
+
 def overlap(s1, s2):
     maxov = min(len(s1), len(s2))
     for i in range(maxov,0,-1):
@@ -79,6 +195,9 @@ def test():
     auto.printAutomata()
     print (auto.applySeq("CACAACAA"))
     print (auto.occurencesPattern("CACAACAA"))
+    print (list(auto.iterMatches("CACAACAA")))
+    matcher = AutomataMatcher(auto)
+    print ([matcher.feed(chunk) for chunk in ["CAC", "AA", "CAA"]])
 
 test()
 
@@ -95,5 +214,7 @@ test()
 #3 , C  ->  2
 #[0, 0, 1, 2, 3, 1, 2, 3, 1]
 #[1, 4]
+#[1, 4]
+#[[], [1], [4]]
 
 
@@ -10,11 +10,24 @@
 #######################################################################################
 
 
+import mmap
+import struct
+from array import array
+from collections import deque
+
+TRIE_MAGIC = b'TRIE'
+TRIE_VERSION = 1
+BYTE_ORDER_MARK = 0x01020304                                                 # read back differently on machines with another byte order
+TRIE_HEADER = struct.Struct('=4sIIII')                                       # magic, version, byte order mark, number of nodes, length of symbols
+
+
 class Trie:
     
     def __init__(self):
         self.nodes = { 0:{} }                                                # the trie is a dictionary
         self.num = 0                                                         # current size of the tree: number of nodes
+        self.ends = {}                                                       # node -> pattern that ends in that node
+        self.fail = None                                                     # failure links (Aho-Corasick), built on demand
     
     def print_trie(self):
         for k in self.nodes.keys():
@@ -50,6 +63,8 @@ class Trie:
                 self.add_node(node, p[pos])                                  # a node is added
             node = self.nodes[node][p[pos]]                                  # update of the node value with the value that corresponds to the symbol p[pos]
             pos +=1                                                          # advance in the pattern
+        self.ends[node] = p                                                  # the pattern ends here (it may also be a prefix of another one)
+        self.fail = None                                                     # links have to be rebuilt
     
     def trie_from_patterns(self, pats):
         ''' 
@@ -62,30 +77,61 @@ class Trie:
         for padrao in pats:
             self.add_pattern(padrao)
     
-    def prefix_trie_match(self, text):
+    def prefix_trie_match(self, text, start = 0):
         ''' 
-        Search for patterns as prefixes of the sequence 'text'.
+        Search for patterns as prefixes of the sequence 'text' starting at index 'start'.
+        The text is not copied: it can be a str, bytes or memoryview (bytes are read as latin-1 symbols).
         
         Parameters
         ----------
-        text : str
+        text  : str, bytes or memoryview
+        start : int
          
         Returns
         ----------
         pattern : str   if it was found.
         None            if it no pattern was found.
         '''
-        pos = 0                                                               # starting at index 0 in the text
-        match = ""                                                            # possible match 
+        pos = start                                                           # starting at index start in the text
         node = 0                                                              # starting at node 0
         while pos < len(text):
-            if text[pos] in self.nodes[node].keys():                          # if the symbol is already represented there can be a pattern 
-                node = self.nodes[node][text[pos]]                            # update of the node value to continue searching
-                match += text[pos]                                            # include the symbol found in the match
-                if self.nodes[node] == {}: return match                       # if it is an empty dict, a leaf was found, meaning: pattern was found
+            c = text[pos]
+            if type(c) is int: c = chr(c)                                     # bytes and memoryview give ints
+            if c in self.nodes[node]:                                         # if the symbol is already represented there can be a pattern 
+                node = self.nodes[node][c]                                    # update of the node value to continue searching
+                if self.nodes[node] == {}:                                    # if it is an empty dict, a leaf was found, meaning: pattern was found
+                    if node in self.ends: return self.ends[node]
+                    return text[start:pos+1]
                 else: pos += 1                                                # no leaf found, continue the search
             else: return None
         return None
+
+    def prefix_trie_matches(self, text, start = 0):
+        ''' 
+        Like prefix_trie_match, but returns every pattern that ends along the walk from 'start',
+        not only the one at the first leaf (e.g. "GA" and "GAT" if both are patterns).
+        
+        Parameters
+        ----------
+        text  : str, bytes or memoryview
+        start : int
+         
+        Returns
+        ----------
+        res : list
+            Patterns that are prefixes of text[start:], from the shortest to the longest.
+        '''
+        res = []
+        pos = start
+        node = 0
+        while pos < len(text):
+            c = text[pos]
+            if type(c) is int: c = chr(c)
+            node = self.nodes[node].get(c)
+            if node is None: break
+            if node in self.ends: res.append(self.ends[node])
+            pos += 1
+        return res
         
     def trie_matches(self, text):
         ''' 
@@ -104,10 +150,270 @@ class Trie:
         '''
         res = []
         for i in range(len(text)):
-            m = self.prefix_trie_match(text[i:])
+            m = self.prefix_trie_match(text, i)                               # offset instead of text[i:]: no copy of the text
             if m is not None:                                                 # if a prefix was found
                 res.append((i,m))                                             # append a tuple with the position and the sequence
         return res
+
+    def trie_all_matches(self, text):
+        ''' 
+        Like trie_matches, but reports every pattern that starts at each position (self.prefix_trie_matches).
+        
+        Parameters
+        ----------
+        text : str, bytes or memoryview
+         
+        Returns
+        ----------
+        res : list
+            List of tuples (index, pattern), sorted by index and then by pattern length.
+        '''
+        res = []
+        for i in range(len(text)):
+            for m in self.prefix_trie_matches(text, i):
+                res.append((i,m))
+        return res
+        
+
+    def build_links(self):
+        ''' 
+        Computes the Aho-Corasick links with a breadth-first traversal of the trie.
+        fail[node] is the node of the longest proper suffix of the string of node that is also in the trie;
+        out[node] is the nearest node in the chain of failure links where a pattern ends (0 if none).
+        '''
+        self.fail = {0: 0}
+        self.out = {0: 0}
+        queue = deque()
+        for child in self.nodes[0].values():
+            self.fail[child] = 0
+            self.out[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self.nodes[node].items():
+                f = self.fail[node]
+                while f != 0 and symbol not in self.nodes[f]:                # follow failure links until symbol can be read
+                    f = self.fail[f]
+                f = self.nodes[f].get(symbol, 0)
+                self.fail[child] = f
+                self.out[child] = f if f in self.ends else self.out[f]
+                queue.append(child)
+
+    def aho_corasick_matches(self, text):
+        ''' 
+        Finds all occurrences of all patterns of the trie in a single left-to-right pass over the text,
+        including overlapping and nested patterns.
+        
+        Parameters
+        ----------
+        text : str, bytes or memoryview
+         
+        Returns
+        ----------
+        res : list
+            List of tuples (index, pattern), in the order in which the occurrences end in the text.
+        '''
+        if self.fail is None: self.build_links()
+        nodes, fail, out, ends = self.nodes, self.fail, self.out, self.ends
+        res = []
+        node = 0
+        for i in range(len(text)):
+            c = text[i]
+            if type(c) is int: c = chr(c)                                     # bytes and memoryview give ints
+            while node != 0 and c not in nodes[node]:
+                node = fail[node]
+            node = nodes[node].get(c, 0)
+            t = node if node in ends else out[node]
+            while t != 0:                                                     # every pattern that ends at position i
+                p = ends[t]
+                res.append((i-len(p)+1, p))
+                t = out[t]
+        return res
+
+    def freeze(self):
+        '''Returns a read-only ArrayTrie with the same patterns (see ArrayTrie).'''
+        return ArrayTrie(self)
+
+    def save(self, path):
+        '''Writes the trie to a file in the ArrayTrie binary format (see ArrayTrie.save).'''
+        self.freeze().save(path)
+
+    @staticmethod
+    def load(path):
+        ''' 
+        Loads a trie saved with save(). The arrays are memory-mapped read-only, so processes that load
+        the same file share one copy in the page cache.
+        
+        Returns
+        ----------
+        ArrayTrie
+        '''
+        at = ArrayTrie()
+        at.load(path)
+        return at
+
+
+class ArrayTrie:
+    ''' 
+    Compact, read-only copy of a Trie stored in flat arrays instead of one dictionary per node.
+    Nodes are renumbered in breadth-first order (root = 0) and symbols get codes 0..nsym-1:
+    - child[code*size + node] is the child of node by the symbol with that code (0 if there is none,
+      since the root is never a child);
+    - depth[node] is the length of the string that leads to node;
+    - terminal and leaf are bitmaps (one bit per node) marking the nodes where a pattern ends and the leaves.
+    '''
+
+    def __init__(self, trie = None):
+        self.symbols = ""                                                    # symbol of each code
+        self.codes = {}                                                      # symbol -> code
+        self.size = 1                                                        # number of nodes
+        self.child = array('i')
+        self.depth = array('i', [0])
+        self.terminal = bytearray(1)
+        self.leaf = bytearray(1)
+        if trie is not None: self.from_trie(trie)
+
+    def from_trie(self, trie):
+        ''' 
+        Fills the arrays from a Trie.
+        
+        Parameters
+        ----------
+        trie : Trie
+        '''
+        symbols = sorted({s for edges in trie.nodes.values() for s in edges})
+        self.symbols = "".join(symbols)
+        self.codes = {s: i for i, s in enumerate(symbols)}
+        order = [0]                                                          # old node ids in breadth-first order
+        for node in order:
+            order.extend(trie.nodes[node][s] for s in sorted(trie.nodes[node]))
+        new = {old: i for i, old in enumerate(order)}
+        n = len(order)
+        self.size = n
+        self.child = array('i', [0]) * (len(symbols) * n)
+        self.depth = array('i', [0]) * n
+        self.terminal = bytearray((n + 7) // 8)
+        self.leaf = bytearray((n + 7) // 8)
+        for old in order:
+            i = new[old]
+            edges = trie.nodes[old]
+            for s, c in edges.items():
+                self.child[self.codes[s]*n + i] = new[c]
+                self.depth[new[c]] = self.depth[i] + 1
+            if not edges:
+                self.leaf[i >> 3] |= 1 << (i & 7)
+            if old in trie.ends or not edges:                                 # leaves are always ends of patterns
+                self.terminal[i >> 3] |= 1 << (i & 7)
+
+    def save(self, path):
+        ''' 
+        Writes the trie to a binary file:
+        header (magic, version, byte order mark, number of nodes, length of symbols), symbols in utf-8
+        padded to 4 bytes, then child and depth as native int32 arrays and the terminal and leaf bitmaps.
+        
+        Parameters
+        ----------
+        path : str
+        '''
+        symbols = self.symbols.encode('utf-8')
+        with open(path, 'wb') as fh:
+            fh.write(TRIE_HEADER.pack(TRIE_MAGIC, TRIE_VERSION, BYTE_ORDER_MARK, self.size, len(symbols)))
+            fh.write(symbols + bytes(-len(symbols) % 4))
+            fh.write(array('i', self.child).tobytes())
+            fh.write(array('i', self.depth).tobytes())
+            fh.write(bytes(self.terminal))
+            fh.write(bytes(self.leaf))
+
+    def load(self, path):
+        ''' 
+        Replaces the contents of this object with a trie saved with save().
+        The file is memory-mapped read-only and the arrays are memoryviews over the map (nothing is copied).
+        
+        Parameters
+        ----------
+        path : str
+        '''
+        with open(path, 'rb') as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access = mmap.ACCESS_READ)
+        buf = memoryview(self.mm)
+        magic, version, bom, size, nsymbytes = TRIE_HEADER.unpack_from(buf, 0)
+        if magic != TRIE_MAGIC or version != TRIE_VERSION:
+            raise ValueError("not a trie file (version %d): %s" % (TRIE_VERSION, path))
+        if bom != BYTE_ORDER_MARK:
+            raise ValueError("trie file was written with a different byte order: %s" % path)
+        pos = TRIE_HEADER.size
+        self.symbols = bytes(buf[pos:pos+nsymbytes]).decode('utf-8')
+        self.codes = {s: i for i, s in enumerate(self.symbols)}
+        self.size = size
+        pos += nsymbytes + (-nsymbytes % 4)
+        nbytes = 4 * len(self.symbols) * size
+        self.child = buf[pos:pos+nbytes].cast('i')
+        pos += nbytes
+        self.depth = buf[pos:pos+4*size].cast('i')
+        pos += 4*size
+        nbits = (size + 7) // 8
+        self.terminal = buf[pos:pos+nbits]
+        pos += nbits
+        self.leaf = buf[pos:pos+nbits]
+
+    def is_terminal(self, node):
+        return (self.terminal[node >> 3] >> (node & 7)) & 1
+
+    def is_leaf(self, node):
+        return (self.leaf[node >> 3] >> (node & 7)) & 1
+
+    def next_node(self, node, c):
+        ''' 
+        Returns the child of node by the symbol c (str, or int for bytes and memoryview), or 0 if there is none.
+        '''
+        if type(c) is int: c = chr(c)
+        code = self.codes.get(c)
+        if code is None: return 0
+        return self.child[code*self.size + node]
+
+    def match_string(self, text, start, node):
+        '''The pattern of a terminal node, read from the text (decoded as latin-1 if it is bytes).'''
+        m = text[start:start+self.depth[node]]
+        if not isinstance(m, str): m = bytes(m).decode('latin-1')
+        return m
+
+    def prefix_trie_match(self, text, start = 0):
+        ''' 
+        Same result as Trie.prefix_trie_match: the pattern at the first leaf reached from text[start], or None.
+        '''
+        node = 0
+        for pos in range(start, len(text)):
+            node = self.next_node(node, text[pos])
+            if node == 0: return None
+            if self.is_leaf(node): return self.match_string(text, start, node)
+        return None
+
+    def prefix_trie_matches(self, text, start = 0):
+        ''' 
+        Same result as Trie.prefix_trie_matches: every pattern that is a prefix of text[start:].
+        '''
+        res = []
+        node = 0
+        for pos in range(start, len(text)):
+            node = self.next_node(node, text[pos])
+            if node == 0: break
+            if self.is_terminal(node): res.append(self.match_string(text, start, node))
+        return res
+
+    def trie_matches(self, text):
+        res = []
+        for i in range(len(text)):
+            m = self.prefix_trie_match(text, i)
+            if m is not None:
+                res.append((i,m))
+        return res
+
+    def trie_all_matches(self, text):
+        res = []
+        for i in range(len(text)):
+            for m in self.prefix_trie_matches(text, i):
+                res.append((i,m))
+        return res
         
           
 def test():
@@ -123,6 +429,9 @@ def test2():
     t.trie_from_patterns(patterns)
     print (t.prefix_trie_match("GAGATCCTA"))
     print (t.trie_matches("GAGATCCTA"))
+    print (t.aho_corasick_matches("GAGATCCTA"))
+    print (t.trie_all_matches(memoryview(b"GAGATCCTA")))
+    print (t.freeze().trie_matches("GAGATCCTA"))
     
 test()
 print()
@@ -6,11 +6,16 @@
 # 
 #
 ###################################################################################################################
+from array import array
+from bisect import bisect_right
+from SuffixArray import suffix_array
+
 class SuffixTree:
     
     def __init__(self):
         self.nodes = { 0:(-1,{}) }                                         # root node: a node corresponds to a tuple
         self.num = 0
+        self.leaves = None                                                 # leaves in depth-first order (compute_leaf_intervals)
     
     def print_tree(self):
         for k in self.nodes.keys():
@@ -33,6 +38,7 @@ class SuffixTree:
         self.num += 1
         self.nodes[origin][1][symbol] = self.num
         self.nodes[self.num] = (leafnum,{})
+        self.leaves = None                                                 # the leaf intervals are no longer valid
         
     def add_suffix(self, p, sufnum):
         '''
@@ -64,6 +70,7 @@ class SuffixTree:
         
         '''
         t = text+"$"
+        self.text = t
         for i in range(len(t)):
             self.add_suffix(t[i:], i)
     
@@ -105,6 +112,8 @@ class SuffixTree:
             List of the leaves bellow a node.
         
         '''
+        if self.leaves is not None:                                        # intervals computed: the leaves are a slice
+            return self.leaves[self.lo[node]:self.hi[node]].tolist()
         res = []                                                           # res will be the list of leaves bellow the node
         if self.nodes[node][0] >=0:                                        # if it's a leaf it will have the position of the suffix
             res.append(self.nodes[node][0])                                # append to the result the position of the suffix
@@ -115,6 +124,737 @@ class SuffixTree:
                 res.extend(leaves)                                         # adds the elements of 'leaves' to res
         return res
 
+    def compute_leaf_intervals(self):
+        '''
+        Optional pass after building the tree: lists the leaves in depth-first order (self.leaves) and
+        stores for each node the interval [lo[node], hi[node]) of its leaves in that list.
+        Afterwards get_leafes_below is a slice, with no recursion.
+        '''
+        n = self.num + 1
+        self.lo = array('i', [0]) * n
+        self.hi = array('i', [0]) * n
+        leaves = array('i')
+        order = []                                                         # preorder, children in insertion order
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            self.lo[node] = len(leaves)
+            if self.nodes[node][0] >= 0:
+                leaves.append(self.nodes[node][0])
+            stack.extend(reversed(list(self.nodes[node][1].values())))
+        for node in reversed(order):                                       # children are done before their parent
+            if self.nodes[node][0] >= 0:
+                self.hi[node] = self.lo[node] + 1
+            elif self.nodes[node][1]:
+                last = list(self.nodes[node][1].values())[-1]
+                self.hi[node] = self.hi[last]
+            else:
+                self.hi[node] = self.lo[node]
+        self.leaves = leaves
+
+    def repeats(self, min_len, min_occ):
+        '''
+        Substrings of length >= min_len that occur >= min_occ times in the sequence.
+        Each node of the tree is one substring (its path): one bottom-up pass counts the leaves below
+        each node and keeps one of them, from which the substring is read.
+
+        Parameters
+        ----------
+        min_len : int
+        min_occ : int
+
+        Returns
+        ----------
+        res : list
+            Sorted list of the repeated substrings.
+        '''
+        depth = {0: 0}
+        order = [0]
+        for node in order:                                                 # top-down: depth of each node
+            for v in self.nodes[node][1].values():
+                depth[v] = depth[node] + 1
+                order.append(v)
+        count = {}
+        first = {}                                                         # one leaf below each node
+        for node in reversed(order):                                       # bottom-up: leaf counts
+            if self.nodes[node][0] >= 0:
+                count[node] = 1
+                first[node] = self.nodes[node][0]
+            else:
+                count[node] = 0
+                for v in self.nodes[node][1].values():
+                    count[node] += count[v]
+                    first[node] = first[v]
+        res = []
+        for node in order[1:]:
+            if count[node] >= min_occ and depth[node] >= min_len:
+                s = self.text[first[node]:first[node]+depth[node]]
+                if not s.endswith("$"): res.append(s)
+        return sorted(res)
+
+    def maximal_repeats(self, min_len, min_occ):
+        '''
+        Maximal repeats: repeated substrings that cannot be extended to the right (their node has two or
+        more children) nor to the left (the symbols before their occurrences are not all the same).
+        Same result as UkkonenSuffixTree.maximal_repeats; the left symbols are found with the leaf counts.
+
+        Parameters
+        ----------
+        min_len : int
+        min_occ : int
+
+        Returns
+        ----------
+        res : list
+            List of tuples (substring, sorted list of positions), sorted by substring.
+        '''
+        diverse = object()
+        depth = {0: 0}
+        order = [0]
+        for node in order:                                                 # top-down: depth of each node
+            for v in self.nodes[node][1].values():
+                depth[v] = depth[node] + 1
+                order.append(v)
+        count = {}
+        left = {}                                                          # symbol before all the occurrences, or diverse
+        for node in reversed(order):                                       # bottom-up: leaf counts and left symbols
+            p = self.nodes[node][0]
+            if p >= 0:
+                count[node] = 1
+                left[node] = self.text[p-1] if p > 0 else diverse
+            else:
+                count[node] = 0
+                left[node] = None
+                for v in self.nodes[node][1].values():
+                    count[node] += count[v]
+                    if left[node] is None: left[node] = left[v]
+                    elif left[node] is not left[v] and left[node] != left[v]: left[node] = diverse
+        res = []
+        for node in order[1:]:
+            if len(self.nodes[node][1]) > 1 and left[node] is diverse and count[node] >= min_occ and depth[node] >= min_len:
+                p = self.get_leafes_below(node)
+                res.append((self.text[p[0]:p[0]+depth[node]], sorted(p)))
+        return sorted(res)
+
+
+class UkkonenSuffixTree:
+    '''
+    Compressed suffix tree built with Ukkonen's online algorithm in O(n) time and nodes.
+    Each edge is labeled by a pair of indexes (start, end) into the text instead of a single symbol,
+    so internal nodes always have two or more children. Node i has:
+    - start[i], end[i]: the label of the edge from its parent is text[start[i]:end[i]];
+    - children[i]: dictionary first symbol of the edge -> child node;
+    - link[i]: suffix link (internal nodes), the node of the path label without its first symbol;
+    - leafnum[i]: the position of the suffix for leaves, -1 for internal nodes.
+    find_pattern and get_leafes_below give the same leaves as in SuffixTree.
+    '''
+
+    def __init__(self):
+        self.text = ""
+        self.start = [0]
+        self.end = [0]
+        self.children = [{}]
+        self.link = [0]
+        self.leafnum = [-1]
+        self.num = 0                                                       # number of the last node created
+        self.leaves = None                                                 # leaves in depth-first order (compute_leaf_intervals)
+        self.depth = [0]                                                   # string depth of each node (compute_depths, done by build)
+
+    def new_node(self, start, end, leafnum = -1):
+        self.start.append(start)
+        self.end.append(end)
+        self.children.append({})
+        self.link.append(0)
+        self.leafnum.append(leafnum)
+        self.num += 1
+        return self.num
+
+    def suffix_tree_from_seq(self, text):
+        '''
+        Adds the symbol $ to the sequence and builds the tree with Ukkonen's algorithm.
+
+        Parameter
+        ----------
+        text : str
+        '''
+        self.build(text + "$")
+
+    def build(self, t):
+        '''
+        Ukkonen's algorithm over t, whose last symbol must occur only once (e.g. "$").
+        In phase i the symbol t[i] is added to all the suffixes still implicit in the tree; the active point
+        (node, first index of the edge, length along the edge) marks where the next insertion happens and
+        remainder counts the suffixes that are still to be inserted.
+
+        Parameter
+        ----------
+        t : str or list of symbols
+        '''
+        self.__init__()
+        self.text = t
+        n = len(t)
+        start, end, children, link = self.start, self.end, self.children, self.link
+        active_node, active_edge, active_len = 0, 0, 0
+        remainder = 0
+        for i in range(n):
+            c = t[i]
+            remainder += 1
+            last_new = 0                                                   # internal node created in this phase waiting for its suffix link
+            while remainder > 0:
+                if active_len == 0: active_edge = i
+                nxt = children[active_node].get(t[active_edge])
+                if nxt is None:                                            # rule 2: new leaf from active_node
+                    children[active_node][t[active_edge]] = self.new_node(i, n, i-remainder+1)
+                    if last_new: link[last_new] = active_node
+                    last_new = 0
+                else:
+                    el = min(end[nxt], i+1) - start[nxt]                   # leaves grow with i
+                    if active_len >= el:                                   # walk down to the next node
+                        active_edge += el
+                        active_len -= el
+                        active_node = nxt
+                        continue
+                    if t[start[nxt] + active_len] == c:                    # rule 3: already in the tree, end of the phase
+                        if last_new: link[last_new] = active_node
+                        active_len += 1
+                        break
+                    split = self.new_node(start[nxt], start[nxt] + active_len)   # rule 2: split the edge
+                    children[active_node][t[active_edge]] = split
+                    children[split][c] = self.new_node(i, n, i-remainder+1)
+                    start[nxt] += active_len
+                    children[split][t[start[nxt]]] = nxt
+                    if last_new: link[last_new] = split
+                    last_new = split
+                remainder -= 1
+                if active_node == 0 and active_len > 0:
+                    active_len -= 1
+                    active_edge = i - remainder + 1
+                elif active_node != 0:
+                    active_node = link[active_node]
+        self.compute_depths()                                              # once per tree, reused by every query
+
+    def print_tree(self):
+        for k in range(self.num + 1):
+            if self.leafnum[k] < 0:
+                print (k, "->", {self.edge_label(v): v for v in self.children[k].values()})
+            else:
+                print (k, ":", self.leafnum[k])
+
+    def edge_label(self, node):
+        return "".join(map(str, self.text[self.start[node]:self.end[node]]))
+
+    def find_pattern(self, pattern):
+        '''
+        Search for the pattern in the tree, comparing it with the labels of the edges.
+
+        Parameter
+        ----------
+        pattern : str
+
+        Returns
+        ----------
+        List of the position where the pattern occurs or None if no matches where found.
+        '''
+        node = self.find_node(pattern)
+        if node is None: return None
+        return self.get_leafes_below(node)
+
+    def find_node(self, pattern):
+        '''
+        Returns the highest node whose path label starts with the pattern, or None if the pattern does not occur.
+        '''
+        t = self.text
+        node = 0
+        pos = 0
+        while pos < len(pattern):
+            node = self.children[node].get(pattern[pos])
+            if node is None: return None
+            i = self.start[node]
+            e = self.end[node]
+            while i < e and pos < len(pattern):
+                if t[i] != pattern[pos]: return None
+                i += 1
+                pos += 1
+        return node
+
+    def get_leafes_below(self, node):
+        '''
+        Colects the leaves under a given node (depth-first, with an explicit stack instead of recursion).
+
+        Parameter
+        ----------
+        node : int
+
+        Returns
+        ----------
+        res : list
+            List of the leaves bellow a node.
+        '''
+        if self.leaves is not None:                                        # intervals computed: the leaves are a slice
+            return self.leaves[self.lo[node]:self.hi[node]].tolist()
+        res = []
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if self.leafnum[n] >= 0:
+                res.append(self.leafnum[n])
+            else:
+                stack.extend(reversed(list(self.children[n].values())))   # reversed: children are visited in insertion order
+        return res
+
+    def preorder(self):
+        '''List of the nodes in depth-first order, each parent before its children.'''
+        order = [0]
+        stack = list(reversed(list(self.children[0].values())))
+        while stack:
+            n = stack.pop()
+            order.append(n)
+            stack.extend(reversed(list(self.children[n].values())))
+        return order
+
+    def compute_leaf_intervals(self):
+        '''
+        Optional pass after building the tree: lists the leaves in depth-first order (self.leaves) and
+        stores for each node the interval [lo[node], hi[node]) of its leaves in that list.
+        Afterwards get_leafes_below is a slice, with no traversal.
+        '''
+        n = self.num + 1
+        self.lo = array('i', [0]) * n
+        self.hi = array('i', [0]) * n
+        leaves = array('i')
+        order = self.preorder()
+        for node in order:
+            self.lo[node] = len(leaves)
+            if self.leafnum[node] >= 0:
+                leaves.append(self.leafnum[node])
+        for node in reversed(order):                                       # children are done before their parent
+            if self.leafnum[node] >= 0:
+                self.hi[node] = self.lo[node] + 1
+            elif self.children[node]:
+                self.hi[node] = self.hi[list(self.children[node].values())[-1]]
+            else:
+                self.hi[node] = self.lo[node]                              # root of an empty tree
+        self.leaves = leaves
+
+    def compute_depths(self):
+        '''
+        Computes self.depth: string depth (length of the path label) of each node.
+        The path label of node i is text[end[i]-depth[i]:end[i]].
+        '''
+        self.depth = [0] * (self.num + 1)
+        for n in self.preorder():
+            for v in self.children[n].values():
+                self.depth[v] = self.depth[n] + self.end[v] - self.start[v]
+        return self.depth
+
+    def path_label(self, node):
+        return self.text[self.end[node]-self.depth[node]:self.end[node]]
+
+    def label_limit(self, node):
+        '''Length of the path label of a node without the terminator (a leaf ends with "$").'''
+        if self.leafnum[node] < 0: return self.depth[node]
+        return len(self.text) - 1 - self.leafnum[node]
+
+    def leaf_counts(self):
+        '''Bottom-up pass: number of leaves below each node.'''
+        count = [0] * (self.num + 1)
+        for n in reversed(self.preorder()):
+            if self.leafnum[n] >= 0:
+                count[n] = 1
+            else:
+                for v in self.children[n].values():
+                    count[n] += count[v]
+        return count
+
+    def repeats(self, min_len, min_occ):
+        '''
+        Substrings of length >= min_len that occur >= min_occ times in the sequence.
+        All the substrings that end inside the edge into a node occur exactly as many times as there are
+        leaves below that node, so one bottom-up pass with leaf counts and string depths is enough.
+
+        Parameters
+        ----------
+        min_len : int
+        min_occ : int
+
+        Returns
+        ----------
+        res : list
+            Sorted list of the repeated substrings.
+        '''
+        count = self.leaf_counts()
+        res = []
+        for n in self.preorder():
+            for v in self.children[n].values():
+                if count[v] < min_occ: continue
+                s = self.end[v] - self.depth[v]                            # an occurrence of the path label of v
+                for length in range(max(self.depth[n]+1, min_len), self.label_limit(v)+1):
+                    res.append("".join(self.text[s:s+length]))
+        return sorted(res)
+
+    def matching_statistics(self, query):
+        '''
+        For each position i of the query, the length of the longest prefix of query[i:] that occurs in the
+        sequence of the tree and one position where it occurs.
+        The query is read once: after position i the match is moved to the suffix i+1 through the suffix
+        link of the deepest node reached, and the part of the match below that node is walked again by
+        edge lengths only (skip/count), so the total work is O(len(query)).
+
+        Parameters
+        ----------
+        query : str
+
+        Returns
+        ----------
+        lengths   : list
+            lengths[i] is the length of the longest match starting at query[i].
+        positions : list
+            positions[i] is a position of the sequence where that match occurs (-1 if the length is 0).
+        '''
+        t, start, end, children, depth = self.text, self.start, self.end, self.children, self.depth
+        m = len(query)
+        lengths = [0] * m
+        positions = [-1] * m
+        node = 0                                                           # deepest node with depth[node] <= l on the matched path
+        l = 0                                                              # length of the current match query[i:i+l]
+        for i in range(m):
+            while True:                                                    # extend the match symbol by symbol
+                if l == depth[node]:
+                    if i+l >= m or query[i+l] not in children[node]: break
+                    child = children[node][query[i+l]]
+                else:
+                    child = children[node][query[i+depth[node]]]
+                k = start[child] + l - depth[node]
+                while k < end[child] and i+l < m and t[k] == query[i+l]:
+                    k += 1
+                    l += 1
+                if k == end[child] and self.leafnum[child] < 0:            # whole edge matched: go down
+                    node = child
+                else: break
+            lengths[i] = l
+            if l > 0:
+                locus = node if l == depth[node] else children[node][query[i+depth[node]]]
+                positions[i] = end[locus] - depth[locus]                   # an occurrence of the path label of locus
+                node = self.link[node]                                     # path label of node without its first symbol (root stays root)
+                l -= 1
+                while l > depth[node]:                                     # skip/count down to the new deepest node
+                    child = children[node][query[i+1+depth[node]]]
+                    if depth[child] > l or self.leafnum[child] >= 0: break
+                    node = child
+        return lengths, positions
+
+    def maximal_repeats(self, min_len, min_occ):
+        '''
+        Maximal repeats: repeated substrings that cannot be extended to the right (they end at an internal
+        node) nor to the left (the symbols before their occurrences are not all the same).
+        The left symbol of each node (or "diverse") is computed in the same bottom-up pass as the leaf counts.
+
+        Parameters
+        ----------
+        min_len : int
+        min_occ : int
+
+        Returns
+        ----------
+        res : list
+            List of tuples (substring, sorted list of positions), sorted by substring.
+        '''
+        diverse = object()
+        count = [0] * (self.num + 1)
+        left = [None] * (self.num + 1)
+        order = self.preorder()
+        for n in reversed(order):
+            p = self.leafnum[n]
+            if p >= 0:
+                count[n] = 1
+                left[n] = self.text[p-1] if p > 0 else diverse
+            else:
+                for v in self.children[n].values():
+                    count[n] += count[v]
+                    if left[n] is None: left[n] = left[v]
+                    elif left[n] is not left[v] and left[n] != left[v]: left[n] = diverse
+        res = []
+        for n in order[1:]:
+            if self.leafnum[n] < 0 and left[n] is diverse and count[n] >= min_occ and self.depth[n] >= min_len:
+                res.append(("".join(self.path_label(n)), sorted(self.get_leafes_below(n))))
+        return sorted(res)
+
+
+class GeneralizedSuffixTree(UkkonenSuffixTree):
+    '''
+    Suffix tree of a collection of sequences, built with Ukkonen's algorithm over the concatenation
+    s0 #0 s1 #1 ... where each separator #k is a distinct symbol (the int -(k+1)), so no pattern
+    can match across two sequences. Leaves are reported as (sequence id, offset) pairs.
+    '''
+
+    def suffix_tree_from_seqs(self, seqs):
+        '''
+        Parameter
+        ----------
+        seqs : list of str
+        '''
+        t = []
+        self.seq_starts = []                                               # position of each sequence in the concatenation
+        for k in range(len(seqs)):
+            self.seq_starts.append(len(t))
+            t.extend(seqs[k])
+            t.append(-(k+1))
+        self.build(t)
+        self.compute_seq_masks()
+
+    def location(self, pos):
+        '''Converts a position of the concatenation into (sequence id, offset), or None for a separator.'''
+        k = bisect_right(self.seq_starts, pos) - 1
+        if type(self.text[pos]) is int: return None
+        return (k, pos - self.seq_starts[k])
+
+    def compute_seq_masks(self):
+        '''
+        Bottom-up pass: self.masks[i] is an int whose bit k is set if a leaf below node i belongs to sequence k.
+        '''
+        self.masks = [0] * (self.num + 1)
+        for n in reversed(self.preorder()):
+            if self.leafnum[n] >= 0:
+                loc = self.location(self.leafnum[n])
+                if loc is not None: self.masks[n] = 1 << loc[0]
+            else:
+                for v in self.children[n].values():
+                    self.masks[n] |= self.masks[v]
+
+    def get_locations_below(self, node):
+        '''List of (sequence id, offset) of the leaves under a node, without the suffixes that start at separators.'''
+        res = []
+        for p in self.get_leafes_below(node):
+            loc = self.location(p)
+            if loc is not None: res.append(loc)
+        return res
+
+    def find_pattern(self, pattern):
+        '''
+        Returns
+        ----------
+        List of (sequence id, offset) where the pattern occurs or None if no matches where found.
+        '''
+        node = self.find_node(pattern)
+        if node is None: return None
+        return self.get_locations_below(node)
+
+    def longest_common_substring(self, min_seqs = None):
+        '''
+        Deepest internal node whose leaves come from at least min_seqs sequences (default: all of them).
+        A min_seqs below 1 is taken as 1.
+
+        Returns
+        ----------
+        str
+            The longest substring shared by at least min_seqs sequences ("" if there is none).
+        '''
+        if min_seqs is None: min_seqs = len(self.seq_starts)
+        min_seqs = max(min_seqs, 1)                                        # leaves of the separators have an empty mask
+        best, best_len = 0, 0
+        for n in range(1, self.num + 1):
+            if bin(self.masks[n]).count("1") >= min_seqs:
+                length = self.label_limit(n)                               # a leaf only counts up to the end of its sequence
+                if length > best_len: best, best_len = n, length
+        s = self.end[best] - self.depth[best]
+        return "".join(self.text[s:s+best_len])
+
+    def label_limit(self, node):
+        '''Length of the path label of a node up to the end of its sequence (leaves run over the separators).'''
+        if self.leafnum[node] < 0: return self.depth[node]
+        loc = self.location(self.leafnum[node])
+        if loc is None: return 0
+        return self.seq_end(loc[0]) - self.leafnum[node]
+
+    def seq_end(self, k):
+        '''Position of the separator of sequence k in the concatenation.'''
+        if k + 1 < len(self.seq_starts): return self.seq_starts[k+1] - 1
+        return len(self.text) - 1
+
+    def shared_kmers(self, k, min_seqs = 2):
+        '''
+        Substrings of length k that occur in at least min_seqs sequences.
+        They are read on the edges that cross string depth k, so each k-mer is visited once.
+
+        Returns
+        ----------
+        res : dict
+            k-mer -> sorted list of the ids of the sequences where it occurs.
+        '''
+        res = {}
+        for n in self.preorder():
+            for v in self.children[n].values():
+                if self.depth[n] < k <= self.depth[v] and bin(self.masks[v]).count("1") >= min_seqs:
+                    s = self.end[v] - self.depth[v]
+                    kmer = self.text[s:s+k]
+                    if all(type(x) is str for x in kmer):                  # not across a separator
+                        mask = self.masks[v]
+                        res["".join(kmer)] = [i for i in range(mask.bit_length()) if mask >> i & 1]
+        return res
+
+
+def lcp_array(t, sa):
+    '''
+    Kasai's algorithm: lcp[i] is the length of the longest common prefix of the suffixes sa[i-1] and sa[i]
+    (lcp[0] = 0). The suffixes are visited in text order, so the common prefix drops by at most one each step.
+    '''
+    n = len(t)
+    rank = array('i', [0]) * n
+    for i in range(n): rank[sa[i]] = i
+    lcp = array('i', [0]) * n
+    h = 0
+    for i in range(n):
+        if rank[i] > 0:
+            j = sa[rank[i]-1]
+            while i+h < n and j+h < n and t[i+h] == t[j+h]: h += 1
+            lcp[rank[i]] = h
+            if h > 0: h -= 1
+        else:
+            h = 0
+    return lcp
+
+
+class EnhancedSuffixArray:
+    '''
+    Enhanced suffix array: the same queries as the suffix tree with a few int arrays instead of nodes.
+    - sa: suffix array of text+"$";
+    - lcp: lcp[i] = longest common prefix of the suffixes sa[i-1] and sa[i] (with -1 at both ends);
+    - up, down, nextl: child table (Abouelhoda et al.), to get the child intervals of an lcp-interval.
+    A node of the suffix tree corresponds to an interval [lo, hi) of sa: its leaves are sa[lo:hi].
+    '''
+
+    def __init__(self):
+        self.text = ""
+        self.sa = array('i')
+
+    def suffix_array_from_seq(self, text):
+        '''
+        Adds the symbol $ to the sequence and builds the suffix array, the lcp array and the child table.
+
+        Parameter
+        ----------
+        text : str
+        '''
+        t = text + "$"
+        n = len(t)
+        self.text = t
+        self.sa = suffix_array(t)
+        lcp = lcp_array(t, self.sa)
+        lcp[0] = -1
+        lcp.append(-1)                                                     # lcp[n] = -1: closes every interval
+        self.lcp = lcp
+        self.up = array('i', [-1]) * (n+1)
+        self.down = array('i', [-1]) * (n+1)
+        self.nextl = array('i', [-1]) * (n+1)
+        last = -1
+        stack = [0]
+        for i in range(1, n+1):
+            while lcp[i] < lcp[stack[-1]]:
+                last = stack.pop()
+                if lcp[i] <= lcp[stack[-1]] and lcp[stack[-1]] != lcp[last]:
+                    self.down[stack[-1]] = last
+            if last != -1:
+                self.up[i] = last
+                last = -1
+            stack.append(i)
+        stack = [0]
+        for i in range(1, n+1):
+            while lcp[i] < lcp[stack[-1]]:
+                stack.pop()
+            if lcp[i] == lcp[stack[-1]]:
+                self.nextl[stack.pop()] = i
+            stack.append(i)
+
+    def first_lindex(self, lo, hi):
+        '''First index k in (lo, hi) where lcp[k] is the lcp of the interval [lo, hi) (hi - lo >= 2).'''
+        if lo < self.up[hi] < hi: return self.up[hi]
+        return self.down[lo]
+
+    def interval_lcp(self, lo, hi):
+        '''String depth of the interval [lo, hi): length of the prefix shared by all its suffixes.'''
+        if hi - lo == 1: return len(self.text) - self.sa[lo]
+        return self.lcp[self.first_lindex(lo, hi)]
+
+    def child_intervals(self, lo, hi):
+        '''
+        Returns
+        ----------
+        res : list
+            The child intervals of [lo, hi), in lexicographic order (the children of the node).
+        '''
+        if hi - lo < 2: return []
+        res = []
+        i1 = self.first_lindex(lo, hi)
+        res.append((lo, i1))
+        while self.nextl[i1] != -1 and self.nextl[i1] < hi:
+            i2 = self.nextl[i1]
+            res.append((i1, i2))
+            i1 = i2
+        res.append((i1, hi))
+        return res
+
+    def find_interval(self, pattern):
+        '''
+        Walks down the child intervals from the root comparing the pattern with the text.
+
+        Returns
+        ----------
+        (lo, hi) of the suffixes that start with the pattern, or None if it does not occur.
+        '''
+        t, sa = self.text, self.sa
+        m = len(pattern)
+        lo, hi = 0, len(sa)
+        pos = 0
+        while True:
+            depth = self.interval_lcp(lo, hi)
+            end = min(depth, m)
+            if t[sa[lo]+pos:sa[lo]+end] != pattern[pos:end]: return None
+            pos = end
+            if pos == m: return (lo, hi)
+            if hi - lo == 1: return None
+            for clo, chi in self.child_intervals(lo, hi):
+                if t[sa[clo]+depth] == pattern[depth]:
+                    lo, hi = clo, chi
+                    break
+            else: return None
+
+    def find_pattern(self, pattern):
+        '''
+        Returns
+        ----------
+        List of the position where the pattern occurs or None if no matches where found.
+        '''
+        interval = self.find_interval(pattern)
+        if interval is None: return None
+        return self.get_leafes_below(interval)
+
+    def get_leafes_below(self, interval):
+        '''Leaves (suffix positions) of the interval (lo, hi): a slice of the suffix array.'''
+        lo, hi = interval
+        return self.sa[lo:hi].tolist()
+
+    def bottom_up(self):
+        '''
+        Bottom-up traversal of the lcp-intervals (the internal nodes of the suffix tree), children first.
+
+        Yields
+        -------
+        (depth, lo, hi)
+            String depth and interval [lo, hi) of each internal node; the root (0, 0, n) is the last one.
+        '''
+        n = len(self.sa)
+        stack = [(0, 0)]                                                   # (lcp, left bound) of the open intervals
+        for i in range(1, n+1):
+            cur = max(self.lcp[i], 0)
+            lb = i - 1
+            while cur < stack[-1][0]:
+                l, lb = stack.pop()
+                yield (l, lb, i)
+            if cur > stack[-1][0]:
+                stack.append((cur, lb))
+        yield (0, 0, n)
+
     
     
 def test():
@@ -130,11 +870,41 @@ def test2():
     st = SuffixTree()
     st.suffix_tree_from_seq(seq)
     print (st.find_pattern("TA"))
-    #print(st.repeats(2,2))
+    st.compute_leaf_intervals()
+    print (st.find_pattern("TA"))
+    print(st.repeats(2,2))
+    print(st.maximal_repeats(1,2))
+
+def test3():
+    seq = "TACTA"
+    st = UkkonenSuffixTree()
+    st.suffix_tree_from_seq(seq)
+    st.print_tree()
+    print (st.find_pattern("TA"))
+    print (st.repeats(2,2))
+    print (st.maximal_repeats(1,2))
+    print (st.matching_statistics("CTAT"))
+
+def test4():
+    gst = GeneralizedSuffixTree()
+    gst.suffix_tree_from_seqs(["TACTA", "CTAGA", "ACTAC"])
+    print (gst.find_pattern("CTA"))
+    print (gst.longest_common_substring())
+    print (gst.shared_kmers(2, 3))
+
+def test5():
+    esa = EnhancedSuffixArray()
+    esa.suffix_array_from_seq("TACTA")
+    print (esa.sa.tolist(), esa.lcp.tolist())
+    print (esa.find_pattern("TA"))
+    print (list(esa.bottom_up()))
 
 test()
 print()
 test2()
+#test3()
+#test4()
+#test5()
         
             
     
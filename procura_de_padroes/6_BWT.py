@@ -3,49 +3,118 @@
 #
 ###########################################
 
+import mmap
+import struct
+from array import array
+from SuffixArray import suffix_array
+
+FM_MAGIC = b'FMIX'
+FM_VERSION = 1
+BYTE_ORDER_MARK = 0x01020304                                                 # read back differently on machines with another byte order
+FM_HEADER = struct.Struct('=4sIIIIII')                                       # magic, version, byte order mark, n, step, sa_sample, number of symbols
+
+
 class BWT:
     
-    def __init__(self, seq = "",buildsufarray = False):
-        self.bwt = self.build_bwt(seq, buildsufarray) 
+    def __init__(self, seq = "",buildsufarray = False, sa_sample = 0):
+        self.sa = None                                                       # full suffix array (buildsufarray)
+        self.sa_sample = 0                                                   # sampled suffix array (sa_sample > 0)
+        self.bwt = self.build_bwt(seq, buildsufarray, sa_sample) 
+        self.C = None                                                        # FM-index, built on demand (build_fm_index)
     
     def set_bwt(self, bw):
+        check_sentinel(bw)
         self.bwt = bw
+        self.C = None
+        self.sa = None                                                       # the suffix arrays belong to the previous text
+        self.sa_sample = 0
 
 
-    def build_bwt(self, text, buildsufarray = False):
-        ls = []
-        # generates ciclic rotations
-        ls = [ ]
-        for i in range(len(text)):
-            ls.append(text[i:]+text[:i])
-        ls.sort()                                                           # lexicographic order
-        res = " "
-        for i in range(len(text)): 
-            res += ls[i][len(text)-1]                                       # recover the last column
+    def build_bwt(self, text, buildsufarray = False, sa_sample = 0):
+        '''
+        Builds the BWT from the suffix array instead of sorting all the cyclic rotations.
+        The text must end with "$", the smallest symbol, that occurs only once: then the order of the rotations
+        is the order of the suffixes, and the last column at row i is the symbol before suffix sa[i].
+        With sa_sample = k > 0 only the entries of the suffix array that are multiples of k are kept (see locate).
+        Raises ValueError for any other (non-empty) text.
+        '''
+        check_sentinel(text)
+        if text and text[-1] != "$": raise ValueError("the text must end with \"$\"")
+        sa = suffix_array(text)
+        res = "".join([text[i-1] for i in sa])                               # text[-1] ("$") for the suffix at 0
+        if buildsufarray:
+            self.sa = sa
+        if sa_sample > 0:
+            self.sample_suffix_array(sa, sa_sample)
         return res                                                          # the result is a string
 
-        if buildsufarray:
-            self.sa = []
-            for i in range(len(ls)):
-                stpos = ls[i].index("$")
-                self.sa.append(len(text)-stpos-1)
-        return res    
+    def sample_suffix_array(self, sa, k):
+        '''
+        Keeps the rows whose suffix position is a multiple of k:
+        - self.sa_marks: bitmap with one bit per row (1 = sampled);
+        - self.sa_rank[b]: number of sampled rows before row 64*b;
+        - self.sa_values: suffix positions of the sampled rows, in row order.
+        Memory is about n/k ints plus n/8 bytes instead of n ints.
+        '''
+        self.sa_sample = k
+        self.sa_marks, self.sa_rank, self.sa_values = sampled_suffix_array(sa, k)
+
+    def locate(self, row):
+        '''
+        Position in the text of the suffix of a row. With a sampled suffix array, LF steps are taken
+        (each one moves to the suffix one position before) until a sampled row is reached: at most k-1 steps.
+        '''
+        if self.sa is not None: return self.sa[row]
+        if self.sa_sample == 0: raise ValueError("no suffix array: build with buildsufarray or sa_sample")
+        if self.C is None: self.build_fm_index()
+        steps = 0
+        while not (self.sa_marks[row >> 3] >> (row & 7)) & 1:
+            c = self.bwt[row]
+            row = self.C[c] + self.rank(c, row)                               # LF mapping
+            steps += 1
+        b = row // 64                                                        # rank of row among the sampled rows
+        r = self.sa_rank[b]
+        for byte in self.sa_marks[b*8:row >> 3]:
+            r += bin(byte).count("1")
+        r += bin(self.sa_marks[row >> 3] & ((1 << (row & 7)) - 1)).count("1")
+        return (self.sa_values[r] + steps) % len(self.bwt)
     
     def inverse_bwt(self):
-        firstcol = self.get_first_col()
-        res = ""                                                             # final result
-        c = "$"                                                              # last character in the sequence
-        occ = 1                                                              # first character occurrence
+        '''
+        Recovers the sequence in O(n) by following the LF mapping from row 0 (the suffix "$"):
+        bwt[row] is the symbol before the suffix of row, and lf[row] is the row of the suffix that starts there.
+        The symbols are written from the end to the start of a preallocated list.
+        '''
+        n = len(self.bwt)
+        if n == 0: return ""
+        check_sentinel(self.bwt)
+        lf = self.lf_array()
+        res = [""] * n
+        res[n-1] = "$"                                                       # last character in the sequence
+        row = 0
+        for i in range(n-2, -1, -1):
+            res[i] = self.bwt[row]
+            row = lf[row]
+        return "".join(res)
+
+    def lf_array(self):
+        '''
+        LF mapping in one pass: lf[i] = C[c] + (occurrences of c in bwt[:i]), with c = bwt[i],
+        where C[c] is the number of symbols smaller than c.
+        '''
+        counts = {}
+        for c in self.bwt: counts[c] = counts.get(c, 0) + 1
+        first = {}                                                           # C[c]: first row of c in the first column
+        total = 0
+        for c in sorted(counts):
+            first[c] = total
+            total += counts[c]
+        lf = array('i', [0]) * len(self.bwt)
         for i in range(len(self.bwt)):
-            pos = find_ith_occ(self.bwt,c,occ)                               # retrieve element from first column in that position
-            c = firstcol[pos]                                                # update c
-            occ = 1                                                          # update occurrence
-            k = pos-1                                                        # or pos -=1                        
-            while firstcol[k] == c and k >=0:
-                occ += 1
-                k -= 1                                                       # decrease in index number
-            res += c
-        return res        
+            c = self.bwt[i]
+            lf[i] = first[c]
+            first[c] += 1
+        return lf
  
     def get_first_col (self):
         '''Recovers the first column by transformim bwt (str) into a sorted list'''
@@ -56,46 +125,213 @@ class BWT:
         return firstcol
         
     def last_to_first(self):
-      '''Creates a table to convert the position of the same symbol from the last to the first column'''
-        res = []
-        firstcol = self.get_first_col()                                       # get the first column
-        for i in range(len(firstcol)):                                        # check occurrences
-            c = self.bwt[i]
-            ocs = self.bwt[:i].count(c)+1
-            res.append(find_ith_occ(firstcol, c, ocs))
-        return res
+        '''Creates a table to convert the position of the same symbol from the last to the first column'''
+        return self.lf_array().tolist()
 
     def bw_matching(self, patt):
-        lf = self.last_to_first()
-        res = []                                                              # list of the positions where pattern occurrs in the 1st column
-        top = 0                                                               # first position
-        bottom = len(self.bwt)-1                                              # last position
-        flag = True
-        while flag and top <= bottom:
-            if patt != "":                                                    # if pattern is not empty continue, else stop
-                symbol = patt[-1]
-                patt = patt[:-1]
-                lmat = self.bwt[top:(bottom+1)]                              
-                if symbol in lmat:                                            # if the symbol exists between top and bottom
-                    topIndex = lmat.index(symbol) + top                       # first occurrence of the symbol
-                    bottomIndex = bottom - lmat[::-1].index(symbol)           # last occurence of the symbol
-                    top = lf[topIndex]                                        # recalculate top
-                    bottom = lf[bottomIndex]                                  # recalculate bottom
-                else: flag = False                                            
-            else: 
-                for i in range(top, bottom+1): res.append(i)                  # append elements between top and bottom to the res list
-                flag = False            
-        return res        
+        '''
+        List of the rows (positions in the 1st column) where the pattern occurs.
+        Backward search over the FM-index (fm_matching): O(len(patt)) rank queries, without building
+        the whole last_to_first table for each query.
+        '''
+        return self.fm_matching(patt)
  
+    def build_fm_index(self, step = 128):
+        '''
+        FM-index over self.bwt:
+        - self.C[c]: number of symbols in the bwt smaller than c (the first row of c in the first column);
+        - self.checkpoints[c][k]: occurrences of c in bwt[:k*step], sampled every step positions.
+        rank(c, i) then costs one checkpoint lookup plus counting at most step symbols.
+        '''
+        self.step = step
+        counts = {}
+        for c in self.bwt: counts[c] = counts.get(c, 0) + 1
+        self.C = {}
+        total = 0
+        for c in sorted(counts):
+            self.C[c] = total
+            total += counts[c]
+        self.checkpoints = {}
+        for c in counts:
+            ck = array('i', [0]) * (len(self.bwt) // step + 1)
+            for k in range(1, len(ck)):
+                ck[k] = ck[k-1] + self.bwt.count(c, (k-1)*step, k*step)
+            self.checkpoints[c] = ck
+
+    def rank(self, c, i):
+        '''Number of occurrences of c in bwt[:i] (needs build_fm_index).'''
+        k = i // self.step
+        return self.checkpoints[c][k] + self.bwt.count(c, k*self.step, i)
+
+    def fm_matching(self, patt):
+        '''
+        Backward search with the FM-index (same result as bw_matching): each symbol of the pattern,
+        from the last to the first, narrows the rows [top, bottom) with two rank queries.
+        '''
+        if self.C is None: self.build_fm_index()
+        top = 0
+        bottom = len(self.bwt)
+        for symbol in reversed(patt):
+            if symbol not in self.C: return []
+            top = self.C[symbol] + self.rank(symbol, top)
+            bottom = self.C[symbol] + self.rank(symbol, bottom)
+            if top >= bottom: return []
+        return list(range(top, bottom))
+
+    def save(self, path):
+        '''
+        Writes the FM-index to a binary file (version FM_VERSION), all arrays as native int32:
+        header (magic, version, byte order mark, n, step, sa_sample, number of symbols),
+        symbols (latin-1), C, Occ checkpoints of each symbol, bwt (latin-1, padded to 4 bytes)
+        and the suffix array, if there is one (rank blocks, number of values, values, row bitmap).
+        A full suffix array (buildsufarray) is written as a sample with k = 1, which keeps every entry.
+
+        Parameters
+        ----------
+        path : str
+        '''
+        if self.C is None: self.build_fm_index()
+        symbols = sorted(self.C)
+        n = len(self.bwt)
+        k = self.sa_sample
+        if self.sa is not None:
+            k = 1
+            marks, rank, values = sampled_suffix_array(self.sa, 1)
+        elif k > 0:
+            marks, rank, values = self.sa_marks, self.sa_rank, self.sa_values
+        with open(path, 'wb') as fh:
+            fh.write(FM_HEADER.pack(FM_MAGIC, FM_VERSION, BYTE_ORDER_MARK, n, self.step, k, len(symbols)))
+            fh.write("".join(symbols).encode('latin-1') + bytes(-len(symbols) % 4))
+            fh.write(array('i', [self.C[c] for c in symbols]).tobytes())
+            for c in symbols:
+                fh.write(array('i', self.checkpoints[c]).tobytes())
+            fh.write(self.bwt.encode('latin-1') if isinstance(self.bwt, str) else bytes(self.bwt.mm))
+            fh.write(bytes(-n % 4))
+            if k > 0:
+                fh.write(array('i', rank).tobytes())
+                fh.write(array('i', [len(values)]).tobytes())
+                fh.write(array('i', values).tobytes())
+                fh.write(bytes(marks))
+
+    @staticmethod
+    def load(path):
+        '''
+        Loads an index saved with save(). The file is memory-mapped read-only and the bwt,
+        the checkpoints and the sampled suffix array are views over the map, so processes that load the
+        same file share it in the page cache and nothing is rebuilt.
+
+        Parameters
+        ----------
+        path : str
+
+        Returns
+        ----------
+        BWT
+        '''
+        bw = BWT()
+        bw.read_index(path)
+        return bw
+
+    def read_index(self, path):
+        '''Replaces the contents of this object with the index in the file path (see load).'''
+        with open(path, 'rb') as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access = mmap.ACCESS_READ)
+        buf = memoryview(self.mm)
+        magic, version, bom, n, step, sa_sample, nsym = FM_HEADER.unpack_from(buf, 0)
+        if magic != FM_MAGIC or version != FM_VERSION:
+            raise ValueError("not an FM-index file (version %d): %s" % (FM_VERSION, path))
+        if bom != BYTE_ORDER_MARK:
+            raise ValueError("FM-index file was written with a different byte order: %s" % path)
+        pos = FM_HEADER.size
+        symbols = bytes(buf[pos:pos+nsym]).decode('latin-1')
+        pos += nsym + (-nsym % 4)
+        C = buf[pos:pos+4*nsym].cast('i')
+        self.C = {symbols[i]: C[i] for i in range(nsym)}
+        pos += 4*nsym
+        self.step = step
+        nck = n // step + 1
+        self.checkpoints = {}
+        for c in symbols:
+            self.checkpoints[c] = buf[pos:pos+4*nck].cast('i')
+            pos += 4*nck
+        self.bwt = MappedText(self.mm, pos, n)
+        pos += n + (-n % 4)
+        self.sa = None
+        self.sa_sample = sa_sample
+        if sa_sample > 0:
+            nblocks = n // 64 + 1
+            self.sa_rank = buf[pos:pos+4*nblocks].cast('i')
+            pos += 4*nblocks
+            nvalues = buf[pos:pos+4].cast('i')[0]
+            pos += 4
+            self.sa_values = buf[pos:pos+4*nvalues].cast('i')
+            pos += 4*nvalues
+            self.sa_marks = buf[pos:pos+(n+7)//8]
+
     def bw_matching_pos(self, patt):
         res = []
-        matches = self.bw_matching(patt)
+        matches = self.fm_matching(patt)
         for m in matches:
-            res.append(self.sa[m])
+            res.append(self.locate(m))                                       # full or sampled suffix array
         res.sort()
         return res
  
 
+def check_sentinel(s):
+    '''
+    Raises ValueError unless s is empty or "$" occurs exactly once in s and is smaller than every other symbol.
+    Only then is row 0 the suffix "$" and the order of the rotations the order of the suffixes.
+    '''
+    if len(s) == 0: return
+    if s.count("$") != 1 or min(s) != "$":
+        raise ValueError("\"$\" must occur once and be the smallest symbol")
+
+
+def sampled_suffix_array(sa, k):
+    '''
+    Rows of the suffix array whose position is a multiple of k (see BWT.sample_suffix_array).
+
+    Returns
+    ----------
+    (marks, rank, values)
+        Row bitmap, number of sampled rows before each block of 64 rows, and the sampled positions in row order.
+    '''
+    n = len(sa)
+    marks = bytearray((n + 7) // 8)
+    rank = array('i', [0]) * (n // 64 + 1)
+    values = array('i')
+    for row in range(n):
+        if row % 64 == 0: rank[row // 64] = len(values)
+        if sa[row] % k == 0:
+            marks[row >> 3] |= 1 << (row & 7)
+            values.append(sa[row])
+    return marks, rank, values
+
+
+class MappedText:
+    '''
+    Read-only text of latin-1 symbols stored in an mmap, with the str operations used by BWT
+    (len, indexing and slicing, iteration and count(c, start, end)).
+    '''
+
+    def __init__(self, mm, offset, length):
+        self.mm = memoryview(mm)[offset:offset+length]
+
+    def __len__(self):
+        return len(self.mm)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return bytes(self.mm[i]).decode('latin-1')
+        return chr(self.mm[i])
+
+    def __iter__(self):
+        return iter(bytes(self.mm).decode('latin-1'))
+
+    def count(self, c, start = 0, end = None):
+        if end is None: end = len(self.mm)
+        return bytes(self.mm[start:end]).count(c.encode('latin-1'))                # copies at most end-start bytes
+
+
 def find_ith_occ(l, elem, index):
     j, k = 0, 0
     while k < index and j < len(l):
@@ -112,6 +348,7 @@ def test():
     print (bw.bwt)
     print (bw.last_to_first())
     print (bw.bw_matching("AGA"))
+    print (bw.fm_matching("AGA"))
 
 
 def test2():
@@ -122,8 +359,10 @@ def test2():
 def test3():
     seq = "TAGACAGAGA$"
     bw = BWT(seq, True)
-    print("Suffix array:", bw.sa)
-    #print(bw.bw_matching_pos("AGA"))
+    print("Suffix array:", bw.sa.tolist())
+    print(bw.bw_matching_pos("AGA"))
+    bw = BWT(seq, sa_sample = 4)
+    print(bw.bw_matching_pos("AGA"))
 
 test()
 #test2()
@@ -0,0 +1,116 @@
+#################################################################################################
+#                        Approximate matching with bit-parallelism
+#
+# Finds the occurrences of a pattern allowing up to k errors.
+# The states of the automaton for the whole pattern are kept as the bits of an integer,
+# so each character of the text is processed with a few shifts, ands and ors:
+# 1. Shift-And (with k+1 bit vectors) for the Hamming distance (only substitutions)
+# 2. Myers' bit-vector algorithm for the edit distance (substitutions, insertions and deletions)
+#
+#################################################################################################
+
+
+def char_masks(pattern):
+    '''
+    Bit mask of each symbol: bit i is set if pattern[i] is that symbol.
+
+    Parameters
+    ----------
+    pattern : str
+
+    Returns
+    -------
+    masks : dict
+    '''
+    masks = {}
+    for i in range(len(pattern)):
+        masks[pattern[i]] = masks.get(pattern[i], 0) | (1 << i)
+    return masks
+
+
+def shift_and_hamming(text, pattern, k):
+    '''
+    Shift-And search allowing up to k mismatches.
+    r[d] has bit i set if pattern[:i+1] matches the text ending at the current position with at most d mismatches.
+
+    Parameters
+    ----------
+    text    : str
+    pattern : str
+    k       : int
+
+    Returns
+    -------
+    res : list
+        List of tuples (index, distance): the pattern occurs starting at index with distance mismatches (distance <= k).
+    '''
+    m = len(pattern)
+    if m == 0: return [(i, 0) for i in range(len(text)+1)]
+    masks = char_masks(pattern)
+    high = 1 << (m-1)                                                         # bit of the last state: a whole occurrence
+    r = [0] * (k+1)
+    res = []
+    for j in range(len(text)):
+        eq = masks.get(text[j], 0)
+        prev = r[0]                                                           # r[d-1] before this character
+        r[0] = ((prev << 1) | 1) & eq
+        for d in range(1, k+1):
+            old = r[d]
+            r[d] = (((old << 1) | 1) & eq) | ((prev << 1) | 1)                # match, or a mismatch at this character
+            prev = old
+        if r[k] & high:
+            d = 0
+            while not r[d] & high: d += 1                                     # smallest number of mismatches
+            res.append((j-m+1, d))
+    return res
+
+
+def myers_edit(text, pattern, k):
+    '''
+    Myers' bit-vector algorithm: edit distance between the pattern and the best substring of the text
+    ending at each position. pv and mv hold the positive and negative vertical differences of the
+    dynamic programming column, one bit per position of the pattern.
+
+    Parameters
+    ----------
+    text    : str
+    pattern : str
+    k       : int
+
+    Returns
+    -------
+    res : list
+        List of tuples (index, distance): an occurrence with distance edits (distance <= k) ends at index (inclusive).
+    '''
+    m = len(pattern)
+    if m == 0: return [(j, 0) for j in range(len(text))]
+    masks = char_masks(pattern)
+    full = (1 << m) - 1
+    high = 1 << (m-1)
+    pv = full
+    mv = 0
+    score = m                                                                 # distance for the empty text
+    res = []
+    for j in range(len(text)):
+        eq = masks.get(text[j], 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high: score += 1
+        elif mh & high: score -= 1
+        ph = (ph << 1) & full                                                 # no carry in: an occurrence may start anywhere
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+        if score <= k:
+            res.append((j, score))
+    return res
+
+
+def test():
+    text = "ATAGAACCAATGAACCATGATGAACCATGGATACCCAACCACC"
+    print(shift_and_hamming(text, "ACCA", 1))
+    print(myers_edit(text, "ACCA", 1))
+
+test()
@@ -0,0 +1,41 @@
+###################################################################################################################
+#                          Suffix Array
+#
+# Shared by 5_suffixtree.py (EnhancedSuffixArray) and 6_BWT.py (BWT and FM-index construction).
+#
+###################################################################################################################
+from array import array
+
+
+def suffix_array(t):
+    '''
+    Suffix array of t by prefix doubling: in round k the suffixes are sorted by the ranks of their first
+    k symbols and of the next k symbols, until all ranks are different (O(n log^2 n), sorting done in C).
+    The ranks, keys and positions are Python lists while it runs, so the peak memory is about 150-170 bytes
+    per symbol (measured with tracemalloc for n = 10^5 and 10^6), far more than the 4 bytes per symbol of the result.
+
+    Parameter
+    ----------
+    t : str
+
+    Returns
+    ----------
+    sa : array('i')
+        Start positions of the suffixes of t in lexicographic order.
+    '''
+    n = len(t)
+    codes = {c: i for i, c in enumerate(sorted(set(t)))}
+    rank = [codes[c] for c in t]
+    sa = list(range(n))
+    k = 1
+    while n > 0:
+        keys = [rank[i]*(n+1) + (rank[i+k]+1 if i+k < n else 0) for i in range(n)]
+        sa.sort(key = keys.__getitem__)
+        r = 0
+        rank[sa[0]] = 0
+        for x in range(1, n):
+            if keys[sa[x]] != keys[sa[x-1]]: r += 1
+            rank[sa[x]] = r
+        if r == n-1: break                                                 # all suffixes already told apart
+        k *= 2
+    return array('i', sa)